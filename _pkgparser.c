@@ -0,0 +1,258 @@
+/*
+ * Native PS4 PKG header validator, used by pkg_parser.PKGParser when built
+ * and PKGPARSER_USE_C=1 is set.
+ *
+ * validate_header(path, trophy_scan_mb) reads the fixed header with pread,
+ * maps the file to walk the entry table and scan for trophy markers with
+ * memmem, and returns a dict of raw fields. The GIL is released while the
+ * file is read. It returns None whenever it cannot vouch for the file (wrong
+ * magic, too small, I/O or mapping failure) so the Python parser can run and
+ * report the error.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <fcntl.h>
+#include <stdint.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#define PKG_MAGIC 0x7F434E54u
+#define HEADER_SIZE 0xC0
+#define ENTRY_SIZE 32
+
+#define ENTRY_CONTENT_ID 0x0100u
+#define ENTRY_TITLE_ID 0x0103u
+#define ENTRY_PARAM_SFO 0x1000u
+
+#define CONTENT_ID_MAX 64
+#define TITLE_ID_MAX 16
+#define PARAM_SFO_MAX 65536
+
+/* Trophy file names are ASCII with fixed casing inside PKGs */
+static const char *const trophy_markers[] = {".trp", ".TRP", "TROPHY", "trophy"};
+
+/* A byte range inside the mapping; present == 0 means the entry was absent */
+typedef struct {
+    int present;
+    size_t offset;
+    size_t length;
+} span;
+
+typedef struct {
+    int fd;
+    unsigned char *map;
+    size_t size;
+    uint32_t pkg_type, pkg_flags, file_count, entry_count;
+    uint32_t content_type, content_flags;
+    uint64_t body_offset, body_size;
+    span content_id, title_id, param_sfo;
+    int trophies;
+} pkg_scan;
+
+static uint32_t
+be32(const unsigned char *p)
+{
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) |
+           ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+}
+
+static uint64_t
+be64(const unsigned char *p)
+{
+    return ((uint64_t)be32(p) << 32) | be32(p + 4);
+}
+
+/* Clamp [offset, offset + min(length, max_len)) to the mapping, like a Python slice */
+static span
+make_span(const pkg_scan *s, uint32_t offset, uint32_t length, size_t max_len)
+{
+    span sp;
+    size_t len = length < max_len ? length : max_len;
+
+    sp.present = 1;
+    sp.offset = offset < s->size ? offset : s->size;
+    sp.length = sp.offset + len <= s->size ? len : s->size - sp.offset;
+    return sp;
+}
+
+static void
+release_scan(pkg_scan *s)
+{
+    if (s->map != NULL && s->map != MAP_FAILED)
+        munmap(s->map, s->size);
+    if (s->fd >= 0)
+        close(s->fd);
+}
+
+/* Runs without the GIL. Returns 1 on success, 0 if Python should take over. */
+static int
+scan_pkg(const char *path, int trophy_scan_mb, pkg_scan *s)
+{
+    unsigned char header[HEADER_SIZE];
+    struct stat st;
+    uint32_t table_offset, count, i;
+    int need_content_id = 1, need_title_id = 1, need_param_sfo = 1;
+    uint32_t sfo_offset = 0, sfo_size = 0;
+    size_t scan_end, m;
+
+    s->fd = open(path, O_RDONLY);
+    if (s->fd < 0 || fstat(s->fd, &st) != 0 || st.st_size < HEADER_SIZE)
+        return 0;
+    s->size = (size_t)st.st_size;
+
+    if (pread(s->fd, header, HEADER_SIZE, 0) != HEADER_SIZE)
+        return 0;
+    if (be32(header) != PKG_MAGIC)
+        return 0;
+
+    s->pkg_type = be32(header + 0x04);
+    s->pkg_flags = be32(header + 0x08);
+    s->file_count = be32(header + 0x10);
+    s->entry_count = be32(header + 0x14);
+    table_offset = be32(header + 0x18);
+    s->body_offset = be64(header + 0x20);
+    s->body_size = be64(header + 0x28);
+    s->content_type = be32(header + 0x70);
+    s->content_flags = be32(header + 0x74);
+
+    s->map = mmap(NULL, s->size, PROT_READ, MAP_SHARED, s->fd, 0);
+    if (s->map == MAP_FAILED)
+        return 0;
+
+    /* Only walk whole rows present in the file, stopping once all are seen */
+    count = s->entry_count;
+    if (table_offset >= s->size)
+        count = 0;
+    else if (count > (s->size - table_offset) / ENTRY_SIZE)
+        count = (uint32_t)((s->size - table_offset) / ENTRY_SIZE);
+
+    for (i = 0; i < count; i++) {
+        const unsigned char *row = s->map + table_offset + (size_t)i * ENTRY_SIZE;
+        uint32_t entry_id = be32(row);
+        uint32_t entry_offset = be32(row + 8);
+        uint32_t entry_size = be32(row + 12);
+
+        if (entry_id == ENTRY_CONTENT_ID) {
+            s->content_id = make_span(s, entry_offset, entry_size, CONTENT_ID_MAX);
+            need_content_id = 0;
+        }
+        else if (entry_id == ENTRY_TITLE_ID) {
+            s->title_id = make_span(s, entry_offset, entry_size, TITLE_ID_MAX);
+            need_title_id = 0;
+        }
+        else if (entry_id == ENTRY_PARAM_SFO) {
+            sfo_offset = entry_offset;
+            sfo_size = entry_size;
+            need_param_sfo = 0;
+        }
+        if (!need_content_id && !need_title_id && !need_param_sfo)
+            break;
+    }
+    if (sfo_offset && sfo_size)
+        s->param_sfo = make_span(s, sfo_offset, sfo_size, PARAM_SFO_MAX);
+
+    scan_end = (size_t)trophy_scan_mb << 20;
+    if (scan_end > s->size)
+        scan_end = s->size;
+    for (m = 0; m < sizeof(trophy_markers) / sizeof(trophy_markers[0]); m++) {
+        if (memmem(s->map, scan_end, trophy_markers[m], strlen(trophy_markers[m])) != NULL) {
+            s->trophies = 1;
+            break;
+        }
+    }
+    return 1;
+}
+
+/* Steals a reference to value; returns -1 on error */
+static int
+set_item(PyObject *dict, const char *key, PyObject *value)
+{
+    int rc;
+
+    if (value == NULL)
+        return -1;
+    rc = PyDict_SetItemString(dict, key, value);
+    Py_DECREF(value);
+    return rc;
+}
+
+static PyObject *
+span_bytes(const pkg_scan *s, span sp)
+{
+    if (!sp.present)
+        Py_RETURN_NONE;
+    return PyBytes_FromStringAndSize((const char *)s->map + sp.offset, (Py_ssize_t)sp.length);
+}
+
+static PyObject *
+validate_header(PyObject *self, PyObject *args)
+{
+    PyObject *path_bytes, *result;
+    int trophy_scan_mb, ok;
+    pkg_scan s;
+
+    if (!PyArg_ParseTuple(args, "O&i:validate_header",
+                          PyUnicode_FSConverter, &path_bytes, &trophy_scan_mb))
+        return NULL;
+
+    memset(&s, 0, sizeof(s));
+    s.fd = -1;
+    s.map = NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    ok = scan_pkg(PyBytes_AS_STRING(path_bytes), trophy_scan_mb, &s);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(path_bytes);
+
+    if (!ok) {
+        release_scan(&s);
+        Py_RETURN_NONE;
+    }
+
+    result = PyDict_New();
+    if (result == NULL
+        || set_item(result, "pkg_type", PyLong_FromUnsignedLong(s.pkg_type)) < 0
+        || set_item(result, "pkg_flags", PyLong_FromUnsignedLong(s.pkg_flags)) < 0
+        || set_item(result, "file_count", PyLong_FromUnsignedLong(s.file_count)) < 0
+        || set_item(result, "entry_count", PyLong_FromUnsignedLong(s.entry_count)) < 0
+        || set_item(result, "body_offset", PyLong_FromUnsignedLongLong(s.body_offset)) < 0
+        || set_item(result, "body_size", PyLong_FromUnsignedLongLong(s.body_size)) < 0
+        || set_item(result, "content_type", PyLong_FromUnsignedLong(s.content_type)) < 0
+        || set_item(result, "content_flags", PyLong_FromUnsignedLong(s.content_flags)) < 0
+        || set_item(result, "content_id", span_bytes(&s, s.content_id)) < 0
+        || set_item(result, "title_id", span_bytes(&s, s.title_id)) < 0
+        || set_item(result, "param_sfo", span_bytes(&s, s.param_sfo)) < 0
+        || set_item(result, "trophies", PyBool_FromLong(s.trophies)) < 0) {
+        Py_XDECREF(result);
+        result = NULL;
+    }
+
+    release_scan(&s);
+    return result;
+}
+
+static PyMethodDef pkgparser_methods[] = {
+    {"validate_header", validate_header, METH_VARARGS,
+     "validate_header(path, trophy_scan_mb) -> dict or None\n\n"
+     "Parse the PKG header, entry table and trophy markers natively.\n"
+     "Returns None if the file is not a PKG this function can handle."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef pkgparser_module = {
+    PyModuleDef_HEAD_INIT,
+    "_pkgparser",
+    "Native PS4 PKG header validator.",
+    -1,
+    pkgparser_methods
+};
+
+PyMODINIT_FUNC
+PyInit__pkgparser(void)
+{
+    return PyModule_Create(&pkgparser_module);
+}
@@ -0,0 +1,8 @@
+"""Precompiled struct formats shared by the parser and its tests."""
+
+import struct
+
+_U16_LE = struct.Struct('<H')
+_U32_LE = struct.Struct('<I')
+_U32_BE = struct.Struct('>I')
+_U64_BE = struct.Struct('>Q')
@@ -1,24 +1,57 @@
 #!/usr/bin/env python3
 """PS4 PKG Validator - GUI Application."""
 
+import json
 import sys
+from collections import OrderedDict
 from pathlib import Path
+from typing import Tuple
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QLabel, QPushButton, QTextEdit, QListWidget,
     QListWidgetItem, QMessageBox
 )
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QFont
+from PyQt6.QtCore import (
+    Qt, QObject, QRunnable, QStandardPaths, QThreadPool, pyqtSignal
+)
+from PyQt6.QtGui import QCloseEvent, QDragEnterEvent, QDropEvent, QFont
 
 from pkg_parser import PKGParser
 
 
+class ParseSignals(QObject):
+    """Signals emitted by ParseWorker back to the GUI thread."""
+    
+    finished = pyqtSignal(str, bool, dict, str)
+
+
+class ParseWorker(QRunnable):
+    """Validate a single PKG file on a thread pool thread."""
+    
+    def __init__(self, file_path: str):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = ParseSignals()
+    
+    def run(self):
+        parser = PKGParser(self.file_path)
+        parser.validate()
+        self.signals.finished.emit(
+            self.file_path, parser.is_valid, parser.info, parser.error_message
+        )
+
+
 class PKGValidatorWindow(QMainWindow):
     """Main application window."""
     
+    CACHE_FILE_NAME = "pkg_cache.json"
+    # Most recently used results kept in the cache
+    CACHE_MAX_ENTRIES = 500
+    
     def __init__(self):
         super().__init__()
+        # Resolved path -> (size, mtime_ns, parse result), least recently used first
+        self._cache = self._load_cache()
         self.init_ui()
         
     def init_ui(self):
@@ -72,6 +105,9 @@ class PKGValidatorWindow(QMainWindow):
         
         self.setAcceptDrops(True)
         self.pkg_data = {}
+        self._paths = set()
+        # Files still being parsed: path -> (list item, cache key, worker)
+        self._pending = {}
         
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -102,31 +138,69 @@ class PKGValidatorWindow(QMainWindow):
     def process_pkg_file(self, file_path: str):
         file_name = Path(file_path).name
         
-        for i in range(self.file_list.count()):
-            if self.file_list.item(i).data(Qt.ItemDataRole.UserRole) == file_path:
-                QMessageBox.information(
-                    self,
-                    "Already Added",
-                    f"'{file_name}' is already in the list."
-                )
-                return
+        if file_path in self._paths:
+            QMessageBox.information(
+                self,
+                "Already Added",
+                f"'{file_name}' is already in the list."
+            )
+            return
+        
+        item = QListWidgetItem()
+        item.setData(Qt.ItemDataRole.UserRole, file_path)
+        self.file_list.addItem(item)
+        self._paths.add(file_path)
+        
+        key = self._cache_key(file_path)
+        cached = self._cache_lookup(key) if key is not None else None
+        
+        if cached is not None:
+            parser = PKGParser(file_path)
+            parser.is_valid = cached['is_valid']
+            parser.info = dict(cached['info'])
+            parser.error_message = cached['error_message']
+            self._set_item_result(item, parser)
+        else:
+            item.setText(f"⋯ {file_name} (parsing…)")
+            item.setForeground(Qt.GlobalColor.gray)
+            
+            worker = ParseWorker(file_path)
+            worker.signals.finished.connect(self.on_parse_finished)
+            self._pending[file_path] = (item, key, worker)
+            QThreadPool.globalInstance().start(worker)
+        
+        self.file_list.setCurrentItem(item)
+    
+    def on_parse_finished(self, file_path: str, is_valid: bool, info: dict, error_message: str):
+        pending = self._pending.pop(file_path, None)
+        if pending is None:
+            # The list was cleared while this file was being parsed
+            return
+        item, key, _ = pending
         
         parser = PKGParser(file_path)
-        is_valid = parser.validate()
+        parser.is_valid = is_valid
+        parser.info = info
+        parser.error_message = error_message
+        # Only cache successes: failures may be transient (e.g. permissions)
+        # and are cheap to re-check since bad files are rejected early
+        if key is not None and is_valid:
+            self._cache_store(key, parser)
         
-        item = QListWidgetItem()
-        if is_valid:
+        self._set_item_result(item, parser)
+        if self.file_list.currentItem() is item:
+            self.on_file_selected(item, None)
+    
+    def _set_item_result(self, item: QListWidgetItem, parser: PKGParser):
+        file_name = parser.file_path.name
+        if parser.is_valid:
             item.setText(f"✓ {file_name}")
             item.setForeground(Qt.GlobalColor.darkGreen)
         else:
             item.setText(f"✗ {file_name}")
             item.setForeground(Qt.GlobalColor.red)
         
-        item.setData(Qt.ItemDataRole.UserRole, file_path)
-        self.file_list.addItem(item)
-        
-        self.pkg_data[file_path] = parser
-        self.file_list.setCurrentItem(item)
+        self.pkg_data[item.data(Qt.ItemDataRole.UserRole)] = parser
     
     def on_file_selected(self, current: QListWidgetItem, previous: QListWidgetItem):
         if current is None:
@@ -137,55 +211,69 @@ class PKGValidatorWindow(QMainWindow):
         parser = self.pkg_data.get(file_path)
         
         if parser is None:
-            self.info_display.setText("Error: No parser data found.")
+            if file_path in self._pending:
+                self.info_display.setText("Parsing…")
+            else:
+                self.info_display.setText("Error: No parser data found.")
+            return
+        
+        # Reuse the HTML rendered on an earlier selection of this file
+        html = getattr(parser, '_rendered_html', None)
+        if html is not None:
+            self.info_display.setHtml(html)
             return
         
         # Display info
+        name = Path(file_path).name
+        info = parser.info
+        parts = []
         if parser.is_valid:
-            info_text = f"<h3>✓ Valid PKG File</h3>"
-            info_text += f"<p><b>File:</b> {Path(file_path).name}</p>"
-            info_text += f"<p><b>Size:</b> {self._format_file_size(file_path)}</p>"
-            info_text += "<hr>"
+            parts.append("<h3>✓ Valid PKG File</h3>")
+            parts.append(f"<p><b>File:</b> {name}</p>")
+            parts.append(f"<p><b>Size:</b> {info.get('Size', 'Unknown')}</p>")
+            parts.append("<hr>")
             
-            if 'Title' in parser.info:
-                info_text += f"<h4>{parser.info['Title']}</h4>"
+            if 'Title' in info:
+                parts.append(f"<h4>{info['Title']}</h4>")
             
-            info_text += "<p><b>PKG Information:</b></p><ul>"
+            parts.append("<p><b>PKG Information:</b></p><ul>")
             for key in ['PKG Type', 'Category', 'PKG Flags', 'Content Type', 'Content Flags']:
-                if key in parser.info:
-                    info_text += f"<li><b>{key}:</b> {parser.info[key]}</li>"
-            info_text += "</ul>"
+                if key in info:
+                    parts.append(f"<li><b>{key}:</b> {info[key]}</li>")
+            parts.append("</ul>")
             
-            info_text += "<p><b>Identifiers:</b></p><ul>"
+            parts.append("<p><b>Identifiers:</b></p><ul>")
             for key in ['Content ID', 'Title ID']:
-                if key in parser.info:
-                    info_text += f"<li><b>{key}:</b> {parser.info[key]}</li>"
-            info_text += "</ul>"
+                if key in info:
+                    parts.append(f"<li><b>{key}:</b> {info[key]}</li>")
+            parts.append("</ul>")
             
-            info_text += "<p><b>Version / Firmware:</b></p><ul>"
+            parts.append("<p><b>Version / Firmware:</b></p><ul>")
             for key in ['App Version', 'Version', 'Minimum Firmware', 'SYSTEM_VER']:
-                if key in parser.info:
+                if key in info:
                     label = key if key != 'SYSTEM_VER' else 'Raw SYSTEM_VER'
-                    info_text += f"<li><b>{label}:</b> {parser.info[key]}</li>"
-            info_text += "</ul>"
+                    parts.append(f"<li><b>{label}:</b> {info[key]}</li>")
+            parts.append("</ul>")
 
-            info_text += "<p><b>Compatibility:</b></p><ul>"
+            parts.append("<p><b>Compatibility:</b></p><ul>")
             for key in ['Trophies Present', 'Backport']:
-                if key in parser.info:
-                    info_text += f"<li><b>{key}:</b> {parser.info[key]}</li>"
-            info_text += "</ul>"
+                if key in info:
+                    parts.append(f"<li><b>{key}:</b> {info[key]}</li>")
+            parts.append("</ul>")
             
-            info_text += "<p><b>File Structure:</b></p><ul>"
+            parts.append("<p><b>File Structure:</b></p><ul>")
             for key in ['File Count', 'Entry Count', 'Body Offset', 'Body Size']:
-                if key in parser.info:
-                    info_text += f"<li><b>{key}:</b> {parser.info[key]}</li>"
-            info_text += "</ul>"
+                if key in info:
+                    parts.append(f"<li><b>{key}:</b> {info[key]}</li>")
+            parts.append("</ul>")
         else:
-            info_text = f"<h3>Invalid PKG File</h3>"
-            info_text += f"<p><b>File:</b> {Path(file_path).name}</p>"
-            info_text += f"<p><b>Error:</b> {parser.error_message}</p>"
+            parts.append("<h3>Invalid PKG File</h3>")
+            parts.append(f"<p><b>File:</b> {name}</p>")
+            parts.append(f"<p><b>Error:</b> {parser.error_message}</p>")
         
-        self.info_display.setHtml(info_text)
+        html = ''.join(parts)
+        parser._rendered_html = html
+        self.info_display.setHtml(html)
     
     def clear_files(self):
         if self.file_list.count() == 0:
@@ -202,8 +290,83 @@ class PKGValidatorWindow(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             self.file_list.clear()
             self.pkg_data.clear()
+            self._pending.clear()
+            self._paths.clear()
             self.info_display.clear()
     
+    def closeEvent(self, event: QCloseEvent):
+        self._save_cache()
+        super().closeEvent(event)
+    
+    def _cache_path(self) -> Path:
+        location = QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.AppLocalDataLocation
+        )
+        return Path(location) / self.CACHE_FILE_NAME
+    
+    def _cache_key(self, file_path: str):
+        """Fingerprint a file by resolved path, size and mtime; None if it can't be stat'ed."""
+        try:
+            path = Path(file_path).resolve()
+            st = path.stat()
+        except OSError:
+            return None
+        return (str(path), st.st_size, st.st_mtime_ns)
+    
+    def _cache_lookup(self, key: tuple):
+        """Return the cached result for a fingerprint, or None if missing or stale."""
+        entry = self._cache.get(key[0])
+        if entry is None or entry[:2] != key[1:]:
+            return None
+        self._cache.move_to_end(key[0])
+        return entry[2]
+    
+    def _cache_store(self, key: tuple, parser: PKGParser):
+        # Replaces any result recorded for an older version of the same file
+        path, size, mtime_ns = key
+        self._cache[path] = (size, mtime_ns, {
+            'is_valid': parser.is_valid,
+            'info': dict(parser.info),
+            'error_message': parser.error_message,
+        })
+        self._cache.move_to_end(path)
+        while len(self._cache) > self.CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+    
+    def _load_cache(self) -> "OrderedDict[str, Tuple[int, int, dict]]":
+        try:
+            with open(self._cache_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Results from a different parser version may be stale or incomplete
+            if data['version'] != PKGParser.INFO_VERSION:
+                return OrderedDict()
+            # Entries are saved oldest first
+            entries = data['entries'][-self.CACHE_MAX_ENTRIES:]
+            return OrderedDict(
+                (e['path'], (e['size'], e['mtime_ns'], {
+                    'is_valid': e['is_valid'],
+                    'info': e['info'],
+                    'error_message': e['error_message'],
+                }))
+                for e in entries
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return OrderedDict()
+    
+    def _save_cache(self):
+        # Stale entries are caught on lookup, so nothing is stat'ed here
+        entries = [
+            {'path': path, 'size': size, 'mtime_ns': mtime_ns, **result}
+            for path, (size, mtime_ns, result) in self._cache.items()
+        ]
+        try:
+            cache_path = self._cache_path()
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': PKGParser.INFO_VERSION, 'entries': entries}, f)
+        except OSError:
+            pass
+    
     def show_about(self):
         QMessageBox.about(
             self,
@@ -218,14 +381,6 @@ class PKGValidatorWindow(QMainWindow):
             "</ul>"
             "<p><b>Version:</b> 1.1.0</p>"
         )
-    
-    def _format_file_size(self, file_path: str) -> str:
-        size = Path(file_path).stat().st_size
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
-        return f"{size:.2f} PB"
 
 
 def main():
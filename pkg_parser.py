@@ -1,61 +1,90 @@
 """PS4 PKG file parser and validator."""
 
+import mmap
+import os
+import re
 import struct
 from pathlib import Path
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from io import BytesIO
 
+from _structs import _U32_BE, _U32_LE
+
+
+# Precompiled layouts for the fixed PKG header and entry table rows
+_HDR_MAIN = struct.Struct('>IIIIIIII')  # 0x00: magic, type, flags, pad, file/entry count, table offset, pad
+_HDR_BODY = struct.Struct('>QQ')        # 0x20: body offset, body size
+_HDR_CONTENT = struct.Struct('>II')     # 0x70: content type, content flags
+_ENTRY = struct.Struct('>IIII16x')      # id, flags, offset, size, padding
+_SFO_ENTRY = struct.Struct('<HHIII')    # key offset, format, length, max length, data offset
+
+# re searches any buffer in place, unlike memoryview which has no find()
+_NUL = re.compile(b'\x00')
+
+try:
+    from sfo_parser import parse as _parse_sfo_compiled
+except ImportError:  # Extension not built, use the pure-Python parser
+    _parse_sfo_compiled = None
+
+try:
+    from _pkgparser import validate_header as _validate_header_c
+except ImportError:  # Extension not built, use the Python header parser
+    _validate_header_c = None
+
+# The C header fast path is opt-in via PKGPARSER_USE_C=1
+_USE_NATIVE = _validate_header_c is not None and os.environ.get('PKGPARSER_USE_C') == '1'
+
 
 class SFOParser:
     """Parse param.sfo file format."""
     
     @staticmethod
-    def parse(data: bytes) -> Dict[str, str]:
-        """Parse param.sfo binary data and return key-value pairs."""
+    def parse(data) -> Dict[str, str]:
+        """Parse param.sfo binary data (bytes or any contiguous buffer) and return key-value pairs."""
+        if _parse_sfo_compiled is not None:
+            return _parse_sfo_compiled(data)
+        return SFOParser._parse_python(data)
+    
+    @staticmethod
+    def _parse_python(data) -> Dict[str, str]:
+        """Pure-Python fallback for parse()."""
         result = {}
         try:
+            data = memoryview(data)
             if len(data) < 20:
                 return result
             
             # Read SFO header
-            magic = struct.unpack('<I', data[0:4])[0]
+            magic = _U32_LE.unpack_from(data, 0)[0]
             if magic != 0x46535000:  # '\x00PSF'
                 return result
             
-            version = struct.unpack('<I', data[4:8])[0]
-            key_table_offset = struct.unpack('<I', data[8:12])[0]
-            data_table_offset = struct.unpack('<I', data[12:16])[0]
-            entry_count = struct.unpack('<I', data[16:20])[0]
+            version = _U32_LE.unpack_from(data, 4)[0]
+            key_table_offset = _U32_LE.unpack_from(data, 8)[0]
+            data_table_offset = _U32_LE.unpack_from(data, 12)[0]
+            entry_count = _U32_LE.unpack_from(data, 16)[0]
             
-            # Read entries
-            for i in range(entry_count):
-                entry_offset = 20 + (i * 16)
-                if entry_offset + 16 > len(data):
-                    break
-                
-                key_offset = struct.unpack('<H', data[entry_offset:entry_offset+2])[0]
-                param_fmt = struct.unpack('<H', data[entry_offset+2:entry_offset+4])[0]
-                param_len = struct.unpack('<I', data[entry_offset+4:entry_offset+8])[0]
-                param_max_len = struct.unpack('<I', data[entry_offset+8:entry_offset+12])[0]
-                data_offset = struct.unpack('<I', data[entry_offset+12:entry_offset+16])[0]
-                
+            # Read entries (only whole rows present in the buffer)
+            entry_count = min(entry_count, (len(data) - 20) // _SFO_ENTRY.size)
+            table = data[20:20 + entry_count * _SFO_ENTRY.size]
+            for key_offset, param_fmt, param_len, param_max_len, data_offset in _SFO_ENTRY.iter_unpack(table):
                 # Read key name
                 key_pos = key_table_offset + key_offset
-                key_end = data.find(b'\x00', key_pos)
-                if key_end == -1:
+                match = _NUL.search(data, key_pos)
+                if match is None:
                     continue
-                key_name = data[key_pos:key_end].decode('utf-8', errors='ignore')
+                key_name = str(data[key_pos:match.start()], 'utf-8', 'ignore')
                 
                 # Read value
                 value_pos = data_table_offset + data_offset
                 if param_fmt == 0x0004:  # UTF-8 string
-                    value_end = data.find(b'\x00', value_pos)
-                    if value_end == -1:
-                        value_end = value_pos + param_len
-                    value = data[value_pos:value_end].decode('utf-8', errors='ignore')
+                    match = _NUL.search(data, value_pos)
+                    value_end = match.start() if match else value_pos + param_len
+                    value = str(data[value_pos:value_end], 'utf-8', 'ignore')
                 elif param_fmt == 0x0404:  # Integer
                     if value_pos + 4 <= len(data):
-                        value = str(struct.unpack('<I', data[value_pos:value_pos+4])[0])
+                        value = str(_U32_LE.unpack_from(data, value_pos)[0])
                     else:
                         value = '0'
                 else:
@@ -81,6 +110,21 @@ class PKGParser:
     ENTRY_TITLE_ID = 0x0103
     ENTRY_PARAM_SFO = 0x1000
     
+    # Fixed header size, also the minimum size of a valid PKG
+    HEADER_SIZE = 0xC0
+    
+    # Only the start of the PKG is scanned for trophy markers
+    TROPHY_SCAN_SIZE = 8 * 1024 * 1024
+    TROPHY_SCAN_STEP = 1024 * 1024
+    # Trophy file names are ASCII with fixed casing inside PKGs
+    TROPHY_MARKERS = (b'.trp', b'.TRP', b'TROPHY', b'trophy')
+    
+    # Upper bound on threads used by validate_many()
+    MAX_WORKERS = 8
+    
+    # Bump whenever the contents of info change so cached results are discarded
+    INFO_VERSION = 1
+    
     def __init__(self, file_path: str):
         """Initialize parser with PKG file path."""
         self.file_path = Path(file_path)
@@ -95,153 +139,223 @@ class PKGParser:
                 self.error_message = "File does not exist"
                 return False
                 
-            if self.file_path.stat().st_size < 0xC0:  # Minimum header size
+            file_size = self.file_path.stat().st_size
+            self.info['Size'] = self._format_size(file_size)
+            
+            if file_size < self.HEADER_SIZE:
                 self.error_message = "File too small to be a valid PKG"
                 return False
                 
-            with open(self.file_path, 'rb') as f:
-                # Read and validate magic number
-                magic = struct.unpack('>I', f.read(4))[0]
+            if _USE_NATIVE:
+                # None means the C fast path could not vouch for the file
+                result = _validate_header_c(str(self.file_path), self.TROPHY_SCAN_SIZE >> 20)
+                if result is not None:
+                    return self._parse_native(result)
+            
+            fd = os.open(self.file_path, os.O_RDONLY)
+            try:
+                # The fixed header is small; read it directly and only map the
+                # file once the magic checks out
+                header = os.pread(fd, self.HEADER_SIZE, 0)
+                magic = _U32_BE.unpack_from(header, 0)[0]
                 if magic != self.PKG_MAGIC:
                     self.error_message = f"Invalid PKG magic: 0x{magic:08X} (expected 0x{self.PKG_MAGIC:08X})"
                     return False
                 
-                # Read PKG type and flags
-                pkg_type = struct.unpack('>I', f.read(4))[0]
-                pkg_flags = struct.unpack('>I', f.read(4))[0]
-                
-                # Read file offset values
-                f.seek(0x10)
-                file_count = struct.unpack('>I', f.read(4))[0]
-                entry_count = struct.unpack('>I', f.read(4))[0]
-                
-                f.seek(0x18)
-                table_offset = struct.unpack('>I', f.read(4))[0]
-                
-                f.seek(0x20)
-                body_offset = struct.unpack('>Q', f.read(8))[0]
-                body_size = struct.unpack('>Q', f.read(8))[0]
-
-                # Read content type / flags (based on community tools)
-                f.seek(0x70)
-                content_type = struct.unpack('>I', f.read(4))[0]
-                content_flags = struct.unpack('>I', f.read(4))[0]
-                
-                # Store basic info
-                self.info['PKG Type'] = self._get_pkg_type_name(pkg_type)
-                self.info['PKG Flags'] = f"0x{pkg_flags:08X}"
-                self.info['File Count'] = str(file_count)
-                self.info['Entry Count'] = str(entry_count)
-                self.info['Body Offset'] = f"0x{body_offset:08X}"
-                self.info['Body Size'] = self._format_size(body_size)
-                self.info['Content Type'] = f"0x{content_type:08X}"
-                self.info['Content Flags'] = f"0x{content_flags:08X}"
-                
-                # Parse entry table for content ID and other metadata
-                self._parse_entry_table(f, table_offset, entry_count)
-                
-                # Extract firmware version from param.sfo if available
-                if 'SYSTEM_VER' in self.info:
-                    try:
-                        sys_ver = int(self.info['SYSTEM_VER'])
-                        if sys_ver > 0:
-                            hex_ver = f"{sys_ver:X}"
-                            if len(hex_ver) >= 3:
-                                fw_ver = f"{hex_ver[0]}.{hex_ver[1:3]}"
-                                self.info['Minimum Firmware'] = fw_ver
-                    except Exception:
-                        pass
-
-                # Trophy presence heuristic (scan small portion for TRP markers)
+                buf = self._map_file(fd)
                 try:
-                    self.info['Trophies Present'] = 'Yes' if self._has_trophy_files() else 'No'
-                except Exception:
-                    self.info['Trophies Present'] = 'Unknown'
-
-                # Backport heuristic: filename contains backport/backported
-                name_lower = self.file_path.name.lower()
-                if 'backport' in name_lower or 'backported' in name_lower:
-                    self.info['Backport'] = 'Likely (filename hint)'
-                else:
-                    self.info['Backport'] = 'Unknown'
-                
-                self.is_valid = True
-                return True
+                    return self._parse_header(header, buf)
+                finally:
+                    if isinstance(buf, mmap.mmap):
+                        buf.close()
+            finally:
+                os.close(fd)
                 
         except Exception as e:
             self.error_message = f"Parse error: {str(e)}"
             return False
     
-    def _parse_entry_table(self, f, table_offset: int, entry_count: int):
+    @classmethod
+    def validate_many(cls, paths: List[str]) -> List['PKGParser']:
+        """Validate several PKG files concurrently, returning parsers in input order."""
+        paths = list(paths)
+        if not paths:
+            return []
+        
+        def run(path: str) -> 'PKGParser':
+            parser = cls(path)
+            parser.validate()
+            return parser
+        
+        # File reads and the native fast path release the GIL, so threads
+        # overlap I/O across files without pickling parsers between processes
+        with ThreadPoolExecutor(max_workers=min(cls.MAX_WORKERS, len(paths))) as executor:
+            return list(executor.map(run, paths))
+    
+    def _map_file(self, fd: int):
+        """Map the open PKG read-only, falling back to a bounded read if mmap fails."""
+        try:
+            return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return os.pread(fd, self.TROPHY_SCAN_SIZE, 0)
+    
+    def _parse_header(self, header: bytes, buf) -> bool:
+        """Parse the fixed PKG header, then the entry table from the mapped (or read) buffer."""
+        (_, pkg_type, pkg_flags, _, file_count, entry_count,
+         table_offset, _) = _HDR_MAIN.unpack_from(header, 0x00)
+        
+        body_offset, body_size = _HDR_BODY.unpack_from(header, 0x20)
+
+        # Read content type / flags (based on community tools)
+        content_type, content_flags = _HDR_CONTENT.unpack_from(header, 0x70)
+        
+        self._store_header_info(pkg_type, pkg_flags, file_count, entry_count,
+                                body_offset, body_size, content_type, content_flags)
+        
+        # Parse entry table for content ID and other metadata
+        self._parse_entry_table(buf, table_offset, entry_count)
+        
+        # Trophy presence heuristic (scan small portion for TRP markers)
+        try:
+            has_trophies = self._has_trophy_files(buf)
+        except Exception:
+            has_trophies = None
+        
+        return self._finish_info(has_trophies)
+    
+    def _parse_native(self, result: dict) -> bool:
+        """Fill info from the C extension's validate_header() result."""
+        self._store_header_info(result['pkg_type'], result['pkg_flags'],
+                                result['file_count'], result['entry_count'],
+                                result['body_offset'], result['body_size'],
+                                result['content_type'], result['content_flags'])
+        
+        if result['content_id'] is not None:
+            self.info['Content ID'] = self._decode_id(result['content_id'])
+        if result['title_id'] is not None:
+            self.info['Title ID'] = self._decode_id(result['title_id'])
+        if result['param_sfo'] is not None:
+            self._store_sfo_info(SFOParser.parse(result['param_sfo']))
+        
+        return self._finish_info(result['trophies'])
+    
+    def _store_header_info(self, pkg_type: int, pkg_flags: int, file_count: int,
+                           entry_count: int, body_offset: int, body_size: int,
+                           content_type: int, content_flags: int):
+        """Store the fixed header fields in info."""
+        self.info['PKG Type'] = self._get_pkg_type_name(pkg_type)
+        self.info['PKG Flags'] = f"0x{pkg_flags:08X}"
+        self.info['File Count'] = str(file_count)
+        self.info['Entry Count'] = str(entry_count)
+        self.info['Body Offset'] = f"0x{body_offset:08X}"
+        self.info['Body Size'] = self._format_size(body_size)
+        self.info['Content Type'] = f"0x{content_type:08X}"
+        self.info['Content Flags'] = f"0x{content_flags:08X}"
+    
+    def _finish_info(self, has_trophies: Optional[bool]) -> bool:
+        """Add derived fields and heuristics, then mark the PKG valid."""
+        # Extract firmware version from param.sfo if available
+        if 'SYSTEM_VER' in self.info:
+            try:
+                sys_ver = int(self.info['SYSTEM_VER'])
+                if sys_ver > 0:
+                    hex_ver = f"{sys_ver:X}"
+                    if len(hex_ver) >= 3:
+                        fw_ver = f"{hex_ver[0]}.{hex_ver[1:3]}"
+                        self.info['Minimum Firmware'] = fw_ver
+            except Exception:
+                pass
+
+        if has_trophies is None:
+            self.info['Trophies Present'] = 'Unknown'
+        else:
+            self.info['Trophies Present'] = 'Yes' if has_trophies else 'No'
+
+        # Backport heuristic: filename contains backport ('backported' included)
+        if 'backport' in self.file_path.name.lower():
+            self.info['Backport'] = 'Likely (filename hint)'
+        else:
+            self.info['Backport'] = 'Unknown'
+        
+        self.is_valid = True
+        return True
+    
+    def _parse_entry_table(self, buf, table_offset: int, entry_count: int):
         """Parse the PKG entry table to extract metadata."""
         try:
-            f.seek(table_offset)
             param_sfo_offset = None
             param_sfo_size = None
             
-            for _ in range(entry_count):
-                entry_id = struct.unpack('>I', f.read(4))[0]
-                entry_flags = struct.unpack('>I', f.read(4))[0]
-                entry_offset = struct.unpack('>I', f.read(4))[0]
-                entry_size = struct.unpack('>I', f.read(4))[0]
-                f.read(16)  # Skip padding
-                
-                current_pos = f.tell()
-                
-                # Extract Content ID
-                if entry_id == self.ENTRY_CONTENT_ID:
-                    f.seek(entry_offset)
-                    content_id = f.read(min(entry_size, 64)).decode('utf-8', errors='ignore').rstrip('\x00')
-                    self.info['Content ID'] = content_id
-                
-                # Extract Title ID  
-                elif entry_id == self.ENTRY_TITLE_ID:
-                    f.seek(entry_offset)
-                    title_id = f.read(min(entry_size, 16)).decode('utf-8', errors='ignore').rstrip('\x00')
-                    self.info['Title ID'] = title_id
-                
-                # Extract param.sfo
-                elif entry_id == self.ENTRY_PARAM_SFO:
-                    param_sfo_offset = entry_offset
-                    param_sfo_size = entry_size
-                
-                f.seek(current_pos)
+            # Only walk whole rows that are actually present in the buffer
+            entry_count = min(entry_count, max(0, len(buf) - table_offset) // _ENTRY.size)
+            
+            # Stop walking the table once every entry we need has been seen
+            wanted = {self.ENTRY_CONTENT_ID, self.ENTRY_TITLE_ID, self.ENTRY_PARAM_SFO}
+            
+            # Zero-copy view of the table, released before the mapping is closed
+            with memoryview(buf)[table_offset:table_offset + entry_count * _ENTRY.size] as table:
+                for entry_id, entry_flags, entry_offset, entry_size in _ENTRY.iter_unpack(table):
+                    # Extract Content ID
+                    if entry_id == self.ENTRY_CONTENT_ID:
+                        raw = buf[entry_offset:entry_offset + min(entry_size, 64)]
+                        self.info['Content ID'] = self._decode_id(raw)
+                    
+                    # Extract Title ID  
+                    elif entry_id == self.ENTRY_TITLE_ID:
+                        raw = buf[entry_offset:entry_offset + min(entry_size, 16)]
+                        self.info['Title ID'] = self._decode_id(raw)
+                    
+                    # Extract param.sfo
+                    elif entry_id == self.ENTRY_PARAM_SFO:
+                        param_sfo_offset = entry_offset
+                        param_sfo_size = entry_size
+                    
+                    wanted.discard(entry_id)
+                    if not wanted:
+                        break
             
             # Parse param.sfo if found
             if param_sfo_offset and param_sfo_size:
-                f.seek(param_sfo_offset)
-                sfo_data = f.read(min(param_sfo_size, 65536))  # Max 64KB
-                sfo_params = SFOParser.parse(sfo_data)
-                
-                # Extract useful parameters
-                if 'TITLE' in sfo_params:
-                    self.info['Title'] = sfo_params['TITLE']
-                if 'TITLE_ID' in sfo_params:
-                    self.info['Title ID'] = sfo_params['TITLE_ID']
-                if 'APP_VER' in sfo_params:
-                    app_ver = sfo_params['APP_VER'].lstrip('0')
-                    self.info['App Version'] = app_ver if app_ver else '0'
-                if 'VERSION' in sfo_params:
-                    ver = sfo_params['VERSION'].lstrip('0')
-                    self.info['Version'] = ver if ver else '0'
-                if 'SYSTEM_VER' in sfo_params:
-                    self.info['SYSTEM_VER'] = sfo_params['SYSTEM_VER']
-                if 'CATEGORY' in sfo_params:
-                    self.info['Category'] = sfo_params['CATEGORY']
+                sfo_end = param_sfo_offset + min(param_sfo_size, 65536)  # Max 64KB
+                with memoryview(buf)[param_sfo_offset:sfo_end] as sfo_data:
+                    sfo_params = SFOParser.parse(sfo_data)
+                self._store_sfo_info(sfo_params)
                 
         except Exception:
             # Non-fatal, just skip metadata extraction
             pass
+    
+    def _store_sfo_info(self, sfo_params: Dict[str, str]):
+        """Extract useful parameters from parsed param.sfo."""
+        if 'TITLE' in sfo_params:
+            self.info['Title'] = sfo_params['TITLE']
+        if 'TITLE_ID' in sfo_params:
+            self.info['Title ID'] = sfo_params['TITLE_ID']
+        if 'APP_VER' in sfo_params:
+            self.info['App Version'] = sfo_params['APP_VER'].lstrip('0') or '0'
+        if 'VERSION' in sfo_params:
+            self.info['Version'] = sfo_params['VERSION'].lstrip('0') or '0'
+        if 'SYSTEM_VER' in sfo_params:
+            self.info['SYSTEM_VER'] = sfo_params['SYSTEM_VER']
+        if 'CATEGORY' in sfo_params:
+            self.info['Category'] = sfo_params['CATEGORY']
+    
+    @staticmethod
+    def _decode_id(raw: bytes) -> str:
+        """Decode a NUL-padded ID string from an entry."""
+        return raw.decode('utf-8', errors='ignore').rstrip('\x00')
 
-    def _has_trophy_files(self) -> bool:
+    def _has_trophy_files(self, buf) -> bool:
         """Heuristic scan for trophy/TRP markers without full extraction."""
-        max_scan = 8 * 1024 * 1024  # scan first 8MB for markers
-        patterns = [b'.trp', b'TROPHY', b'TROPHY.TRP']
+        end = min(len(buf), self.TROPHY_SCAN_SIZE)
+        overlap = max(len(pat) for pat in self.TROPHY_MARKERS) - 1
         try:
-            with open(self.file_path, 'rb') as fh:
-                chunk = fh.read(max_scan)
-                data_lower = chunk.lower()
-                return any(pat.lower() in data_lower for pat in patterns)
+            # Scan window by window so an early hit only pages in that window
+            for start in range(0, end, self.TROPHY_SCAN_STEP):
+                stop = min(start + self.TROPHY_SCAN_STEP + overlap, end)
+                if any(buf.find(pat, start, stop) != -1 for pat in self.TROPHY_MARKERS):
+                    return True
+            return False
         except Exception:
             return False
     
@@ -0,0 +1,23 @@
+"""Build the optional compiled parser extensions.
+
+    pip install cython
+    python setup.py build_ext --inplace
+
+pkg_parser.py falls back to the pure-Python code when they are not built.
+The native header validator (_pkgparser) is POSIX-only and is used only
+when PKGPARSER_USE_C=1 is set.
+"""
+
+import os
+
+from setuptools import Extension, setup
+from Cython.Build import cythonize
+
+ext_modules = cythonize(['sfo_parser.pyx'], language_level=3)
+if os.name == 'posix':
+    ext_modules.append(Extension('_pkgparser', ['_pkgparser.c']))
+
+setup(
+    name='ps4-pkg-validator',
+    ext_modules=ext_modules,
+)
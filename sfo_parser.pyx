@@ -0,0 +1,79 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled param.sfo parser, used by pkg_parser.SFOParser when built."""
+
+from libc.stdint cimport uint16_t, uint32_t
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+
+
+cdef inline uint16_t _u16(const unsigned char* p) noexcept nogil:
+    """Read a little-endian uint16 (byte-wise, so unaligned offsets are safe)."""
+    return <uint16_t>(p[0] | (<uint16_t>p[1] << 8))
+
+
+cdef inline uint32_t _u32(const unsigned char* p) noexcept nogil:
+    """Read a little-endian uint32 (byte-wise, so unaligned offsets are safe)."""
+    return (<uint32_t>p[0] | (<uint32_t>p[1] << 8) |
+            (<uint32_t>p[2] << 16) | (<uint32_t>p[3] << 24))
+
+
+cpdef dict parse(const unsigned char[::1] data):
+    """Parse param.sfo binary data and return key-value pairs."""
+    cdef dict result = {}
+    cdef Py_ssize_t n = data.shape[0]
+    if n < 20:
+        return result
+
+    cdef const unsigned char* p = &data[0]
+    if _u32(p) != 0x46535000:  # '\x00PSF'
+        return result
+
+    cdef Py_ssize_t key_table_offset = _u32(p + 8)
+    cdef Py_ssize_t data_table_offset = _u32(p + 12)
+    cdef uint32_t entry_count = _u32(p + 16)
+
+    cdef Py_ssize_t i, entry_offset, key_pos, key_end, value_pos, value_end
+    cdef uint16_t param_fmt
+    cdef uint32_t param_len
+    cdef str key_name, value
+
+    for i in range(entry_count):
+        entry_offset = 20 + (i * 16)
+        if entry_offset + 16 > n:
+            break
+
+        param_fmt = _u16(p + entry_offset + 2)
+        param_len = _u32(p + entry_offset + 4)
+
+        # Read key name
+        key_pos = key_table_offset + _u16(p + entry_offset)
+        key_end = key_pos
+        while key_end < n and p[key_end] != 0:
+            key_end += 1
+        if key_end >= n:
+            continue
+        key_name = PyUnicode_DecodeUTF8(<const char*>p + key_pos, key_end - key_pos, "ignore")
+
+        # Read value
+        value_pos = data_table_offset + _u32(p + entry_offset + 12)
+        if param_fmt == 0x0004:  # UTF-8 string
+            if value_pos >= n:
+                value = ''
+            else:
+                value_end = value_pos
+                while value_end < n and p[value_end] != 0:
+                    value_end += 1
+                if value_end >= n:
+                    value_end = min(value_pos + param_len, n)
+                value = PyUnicode_DecodeUTF8(<const char*>p + value_pos, value_end - value_pos, "ignore")
+        elif param_fmt == 0x0404:  # Integer
+            if value_pos + 4 <= n:
+                value = str(_u32(p + value_pos))
+            else:
+                value = '0'
+        else:
+            value = ''
+
+        if key_name and value:
+            result[key_name] = value
+
+    return result
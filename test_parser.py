@@ -1,64 +1,67 @@
 """Unit tests for PKG parser."""
 
-import struct
+import os
 import tempfile
 from pathlib import Path
-from pkg_parser import PKGParser
+from unittest import mock
+from _structs import _U16_LE, _U32_BE, _U32_LE, _U64_BE
+import pkg_parser
+from pkg_parser import PKGParser, SFOParser, _parse_sfo_compiled, _validate_header_c
 
 
 def create_test_pkg(file_path: str, magic: int = 0x7F434E54, valid: bool = True):
     """Create a minimal test PKG file with synthetic header."""
     with open(file_path, 'wb') as f:
         # Magic number
-        f.write(struct.pack('>I', magic))
+        f.write(_U32_BE.pack(magic))
         
         # PKG type (0x1 = PS4 App)
-        f.write(struct.pack('>I', 0x1))
+        f.write(_U32_BE.pack(0x1))
         
         # PKG flags
-        f.write(struct.pack('>I', 0x00000000))
+        f.write(_U32_BE.pack(0x00000000))
         
         # File offset (0x0C)
-        f.write(struct.pack('>I', 0x00000000))
+        f.write(_U32_BE.pack(0x00000000))
         
         # File count and entry count (0x10)
-        f.write(struct.pack('>I', 5))  # file_count
-        f.write(struct.pack('>I', 3))  # entry_count (includes param.sfo)
+        f.write(_U32_BE.pack(5))  # file_count
+        f.write(_U32_BE.pack(3))  # entry_count (includes param.sfo)
         
         # Table offset (0x18)
-        f.write(struct.pack('>I', 0xC0))  # table_offset
+        f.write(_U32_BE.pack(0xC0))  # table_offset
         
         # Reserved (0x1C)
-        f.write(struct.pack('>I', 0x00000000))
+        f.write(_U32_BE.pack(0x00000000))
         
         # Body offset and size (0x20)
-        f.write(struct.pack('>Q', 0x1000))  # body_offset
-        f.write(struct.pack('>Q', 0x100000))  # body_size
+        f.write(_U64_BE.pack(0x1000))  # body_offset
+        f.write(_U64_BE.pack(0x100000))  # body_size
         
         # Pad to minimum size
         f.write(b'\x00' * (0xC0 - f.tell()))
         
         if valid:
             # Entry 1: Content ID
-            f.write(struct.pack('>I', 0x0100))  # entry_id (ENTRY_CONTENT_ID)
-            f.write(struct.pack('>I', 0x00))    # flags
-            f.write(struct.pack('>I', 0x200))   # offset
-            f.write(struct.pack('>I', 48))      # size
-            f.write(b'\x00' * 16)                # padding
+            f.write(_U32_BE.pack(0x0100))  # entry_id (ENTRY_CONTENT_ID)
+            f.write(_U32_BE.pack(0x00))    # flags
+            f.write(_U32_BE.pack(0x200))   # offset
+            f.write(_U32_BE.pack(48))      # size
+            f.write(b'\x00' * 16)             # padding
             
             # Entry 2: Title ID
-            f.write(struct.pack('>I', 0x0103))  # entry_id (ENTRY_TITLE_ID)
-            f.write(struct.pack('>I', 0x00))    # flags
-            f.write(struct.pack('>I', 0x250))   # offset
-            f.write(struct.pack('>I', 16))      # size
-            f.write(b'\x00' * 16)                # padding
+            f.write(_U32_BE.pack(0x0103))  # entry_id (ENTRY_TITLE_ID)
+            f.write(_U32_BE.pack(0x00))    # flags
+            f.write(_U32_BE.pack(0x250))   # offset
+            f.write(_U32_BE.pack(16))      # size
+            f.write(b'\x00' * 16)             # padding
             
             # Entry 3: param.sfo
-            f.write(struct.pack('>I', 0x1000))  # entry_id (ENTRY_PARAM_SFO)
-            f.write(struct.pack('>I', 0x00))    # flags
-            f.write(struct.pack('>I', 0x300))   # offset
-            f.write(struct.pack('>I', 0x200))   # size
-            f.write(b'\x00' * 16)                # padding
+            f.write(_U32_BE.pack(0x1000))  # entry_id (ENTRY_PARAM_SFO)
+            f.write(_U32_BE.pack(0x00))    # flags
+            f.write(_U32_BE.pack(0x300))   # offset
+            f.write(_U32_BE.pack(0x200))   # size
+            f.write(b'\x00' * 16)             # padding
             
             # Add content at offset 0x200
             f.seek(0x200)
@@ -71,32 +74,32 @@ def create_test_pkg(file_path: str, magic: int = 0x7F434E54, valid: bool = True)
             # Add minimal param.sfo at offset 0x300
             f.seek(0x300)
             # SFO header: magic, version, key_table_offset, data_table_offset, entry_count
-            f.write(struct.pack('<I', 0x46535000))  # PSF magic
-            f.write(struct.pack('<I', 0x00000101))  # version
-            f.write(struct.pack('<I', 0x54))        # key_table_offset
-            f.write(struct.pack('<I', 0x80))        # data_table_offset
-            f.write(struct.pack('<I', 0x03))        # entry_count
+            f.write(_U32_LE.pack(0x46535000))  # PSF magic
+            f.write(_U32_LE.pack(0x00000101))  # version
+            f.write(_U32_LE.pack(0x54))        # key_table_offset
+            f.write(_U32_LE.pack(0x80))        # data_table_offset
+            f.write(_U32_LE.pack(0x03))        # entry_count
             
             # Entry 1: TITLE
-            f.write(struct.pack('<H', 0x00))        # key_offset
-            f.write(struct.pack('<H', 0x0004))      # format (UTF-8)
-            f.write(struct.pack('<I', 20))          # length
-            f.write(struct.pack('<I', 128))         # max_length
-            f.write(struct.pack('<I', 0x00))        # data_offset
+            f.write(_U16_LE.pack(0x00))        # key_offset
+            f.write(_U16_LE.pack(0x0004))      # format (UTF-8)
+            f.write(_U32_LE.pack(20))          # length
+            f.write(_U32_LE.pack(128))         # max_length
+            f.write(_U32_LE.pack(0x00))        # data_offset
             
             # Entry 2: SYSTEM_VER
-            f.write(struct.pack('<H', 0x06))        # key_offset (after "TITLE\0")
-            f.write(struct.pack('<H', 0x0404))      # format (uint32)
-            f.write(struct.pack('<I', 4))           # length
-            f.write(struct.pack('<I', 4))           # max_length
-            f.write(struct.pack('<I', 0x80))        # data_offset
+            f.write(_U16_LE.pack(0x06))        # key_offset (after "TITLE\0")
+            f.write(_U16_LE.pack(0x0404))      # format (uint32)
+            f.write(_U32_LE.pack(4))           # length
+            f.write(_U32_LE.pack(4))           # max_length
+            f.write(_U32_LE.pack(0x80))        # data_offset
             
             # Entry 3: APP_VER
-            f.write(struct.pack('<H', 0x11))        # key_offset (after "SYSTEM_VER\0")
-            f.write(struct.pack('<H', 0x0004))      # format (UTF-8)
-            f.write(struct.pack('<I', 8))           # length
-            f.write(struct.pack('<I', 8))           # max_length
-            f.write(struct.pack('<I', 0x84))        # data_offset
+            f.write(_U16_LE.pack(0x11))        # key_offset (after "SYSTEM_VER\0")
+            f.write(_U16_LE.pack(0x0004))      # format (UTF-8)
+            f.write(_U32_LE.pack(8))           # length
+            f.write(_U32_LE.pack(8))           # max_length
+            f.write(_U32_LE.pack(0x84))        # data_offset
             
             # Key table at 0x54
             f.seek(0x354)
@@ -106,7 +109,7 @@ def create_test_pkg(file_path: str, magic: int = 0x7F434E54, valid: bool = True)
             f.seek(0x380)
             f.write(b'Test PKG Game\x00')  # TITLE
             f.seek(0x380 + 0x80)
-            f.write(struct.pack('<I', 0x08500000))  # SYSTEM_VER = 8.50
+            f.write(_U32_LE.pack(0x08500000))  # SYSTEM_VER = 8.50
             f.seek(0x380 + 0x84)
             f.write(b'01.05\x00')  # APP_VER
 
@@ -124,6 +127,7 @@ def test_valid_pkg():
         assert parser.is_valid is True
         assert parser.error_message == ""
         assert parser.info.get('PKG Type') == 'PS4 App'
+        assert parser.info.get('Size') == '1.01 KB'
         assert 'Content ID' in parser.info
         assert 'EP1234-CUSA12345' in parser.info['Content ID']
         assert parser.info.get('Title') == 'Test PKG Game'
@@ -174,10 +178,176 @@ def test_nonexistent_file():
     print("✓ Nonexistent file test passed")
 
 
+def test_backport_hint():
+    """Test the filename backport heuristic."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, expected in [
+            ('game.pkg', 'Unknown'),
+            ('Game-Backport.pkg', 'Likely (filename hint)'),
+            ('game_BACKPORTED_5.05.pkg', 'Likely (filename hint)'),
+        ]:
+            tmp_path = str(Path(tmp_dir) / name)
+            create_test_pkg(tmp_path, valid=True)
+            parser = PKGParser(tmp_path)
+            assert parser.validate() is True
+            assert parser.info.get('Backport') == expected, name
+    print("✓ Backport hint test passed")
+
+
+def test_trophy_detection():
+    """Test the trophy marker heuristic."""
+    with tempfile.NamedTemporaryFile(suffix='.pkg', delete=False) as tmp:
+        tmp_path = tmp.name
+    
+    try:
+        create_test_pkg(tmp_path, valid=True)
+        parser = PKGParser(tmp_path)
+        assert parser.validate() is True
+        assert parser.info.get('Trophies Present') == 'No'
+        
+        with open(tmp_path, 'ab') as f:
+            f.write(b'trophy/TROPHY.TRP\x00')
+        parser = PKGParser(tmp_path)
+        assert parser.validate() is True
+        assert parser.info.get('Trophies Present') == 'Yes'
+        
+        # Markers straddling a scan window boundary are still found
+        parser.TROPHY_SCAN_STEP = 16
+        assert parser._has_trophy_files(b'\x00' * 14 + b'TROPHY' + b'\x00' * 20) is True
+        assert parser._has_trophy_files(b'\x00' * 40) is False
+        print("✓ Trophy detection test passed")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def test_file_opened_once():
+    """Test validate() shares one open file between header and trophy scan."""
+    with tempfile.NamedTemporaryFile(suffix='.pkg', delete=False) as tmp:
+        tmp_path = tmp.name
+    
+    try:
+        create_test_pkg(tmp_path, valid=True)
+        
+        real_open = os.open
+        with mock.patch('os.open', side_effect=real_open) as open_spy, \
+                mock.patch.object(pkg_parser, '_USE_NATIVE', False):
+            parser = PKGParser(tmp_path)
+            assert parser.validate() is True
+        assert open_spy.call_count == 1
+        assert 'Trophies Present' in parser.info
+        print("✓ Single open test passed")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def test_validate_many():
+    """Test validating several files at once keeps input order."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(5):
+            path = str(Path(tmp_dir) / f'game{i}.pkg')
+            create_test_pkg(path, magic=0x7F434E54 if i % 2 == 0 else 0xDEADBEEF, valid=i % 2 == 0)
+            paths.append(path)
+        paths.append(str(Path(tmp_dir) / 'missing.pkg'))
+        
+        parsers = PKGParser.validate_many(paths)
+        assert [str(p.file_path) for p in parsers] == paths
+        assert [p.is_valid for p in parsers] == [True, False, True, False, True, False]
+        assert parsers[0].info.get('Title') == 'Test PKG Game'
+        assert "does not exist" in parsers[-1].error_message
+        assert PKGParser.validate_many([]) == []
+    print("✓ Validate many test passed")
+
+
+def test_sfo_accepts_memoryview():
+    """Test param.sfo parsing straight from a memoryview slice."""
+    with tempfile.NamedTemporaryFile(suffix='.pkg', delete=False) as tmp:
+        tmp_path = tmp.name
+    
+    try:
+        create_test_pkg(tmp_path, valid=True)
+        data = Path(tmp_path).read_bytes()
+        
+        expected = SFOParser._parse_python(data[0x300:0x500])
+        assert expected.get('APP_VER') == '01.05'
+        assert SFOParser._parse_python(memoryview(data)[0x300:0x500]) == expected
+        assert SFOParser.parse(memoryview(data)[0x300:0x500]) == expected
+        print("✓ SFO memoryview test passed")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def test_sfo_compiled_matches_python():
+    """Test the compiled SFO parser agrees with the pure-Python fallback."""
+    if _parse_sfo_compiled is None:
+        print("- Compiled SFO parser not built, skipping")
+        return
+    
+    with tempfile.NamedTemporaryFile(suffix='.pkg', delete=False) as tmp:
+        tmp_path = tmp.name
+    
+    try:
+        create_test_pkg(tmp_path, valid=True)
+        sfo_data = Path(tmp_path).read_bytes()[0x300:0x500]
+        
+        expected = SFOParser._parse_python(sfo_data)
+        assert expected['TITLE'] == 'Test PKG Game'
+        assert _parse_sfo_compiled(sfo_data) == expected
+        # Truncated input must degrade the same way
+        assert _parse_sfo_compiled(sfo_data[:0x60]) == SFOParser._parse_python(sfo_data[:0x60])
+        print("✓ Compiled SFO parser test passed")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def test_native_matches_python():
+    """Test the C header validator produces the same info as the Python path."""
+    if _validate_header_c is None:
+        print("- Native header validator not built, skipping")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        valid_path = str(Path(tmp_dir) / 'valid.pkg')
+        trophy_path = str(Path(tmp_dir) / 'trophy.pkg')
+        bad_path = str(Path(tmp_dir) / 'bad.pkg')
+        create_test_pkg(valid_path, valid=True)
+        create_test_pkg(trophy_path, valid=True)
+        with open(trophy_path, 'ab') as f:
+            f.write(b'TROPHY.TRP\x00')
+        create_test_pkg(bad_path, magic=0xDEADBEEF, valid=False)
+        
+        assert _validate_header_c(bad_path, 8) is None
+        
+        use_native = pkg_parser._USE_NATIVE
+        try:
+            for path in (valid_path, trophy_path, bad_path):
+                pkg_parser._USE_NATIVE = False
+                expected = PKGParser(path)
+                expected.validate()
+                
+                pkg_parser._USE_NATIVE = True
+                native = PKGParser(path)
+                native.validate()
+                
+                assert native.is_valid == expected.is_valid, path
+                assert native.info == expected.info, path
+                assert native.error_message == expected.error_message, path
+        finally:
+            pkg_parser._USE_NATIVE = use_native
+    print("✓ Native header validator test passed")
+
+
 if __name__ == '__main__':
     print("Running PKG parser tests...\n")
     test_valid_pkg()
     test_invalid_magic()
     test_file_too_small()
     test_nonexistent_file()
+    test_backport_hint()
+    test_trophy_detection()
+    test_file_opened_once()
+    test_validate_many()
+    test_sfo_accepts_memoryview()
+    test_sfo_compiled_matches_python()
+    test_native_matches_python()
     print("\n✓ All tests passed!")